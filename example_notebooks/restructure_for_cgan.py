@@ -12,10 +12,19 @@ It also filters forecast hours to 30-54 (every 6 hours) as required by the cGAN
 
 import xarray as xr
 import numpy as np
+import dask
+import netCDF4
 import os
+import re
+import shutil
 from pathlib import Path
 import argparse
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 
 # Variable name mapping: current_name -> cgan_name
 VARIABLE_MAPPING = {
@@ -30,21 +39,266 @@ VARIABLE_MAPPING = {
 }
 
 
-def restructure_netcdf_for_cgan(
-    input_file: str,
+if njit is not None:
+    @njit(cache=True)
+    def _pick_indices_ns(step_ns, targets_ns, tol_ns):
+        """Nearest-step scan in integer nanoseconds; -1 marks unmatched targets."""
+        out = np.full(targets_ns.size, -1, np.int64)
+        for j in range(targets_ns.size):
+            t = targets_ns[j]
+            best = 0
+            best_dist = abs(step_ns[0] - t)
+            for i in range(1, step_ns.size):
+                dist = abs(step_ns[i] - t)
+                if dist < best_dist:
+                    best_dist = dist
+                    best = i
+            if best_dist < tol_ns:
+                out[j] = best
+        return out
+
+
+def _find_step_indices(step_ns, target_hours):
+    """
+    Find the index of the step closest to each target hour, within 30 minutes.
+
+    step_ns is the raw step axis in nanoseconds. With numba installed the
+    match runs as a single JIT-compiled integer scan with no temporary
+    arrays; otherwise it falls back to a vectorized searchsorted pass on the
+    hour-converted axis.
+    """
+    if njit is not None:
+        targets_ns = (np.asarray(target_hours) * 3.6e12).astype(np.int64)
+        picked = _pick_indices_ns(
+            np.ascontiguousarray(step_ns).astype(np.int64, copy=False),
+            targets_ns,
+            np.int64(0.5 * 3.6e12),  # 30-minute tolerance
+        )
+        for hour in np.asarray(target_hours)[picked < 0]:
+            print(f"  Warning: No step found near hour {hour}")
+        return picked[picked >= 0]
+
+    step_hours = step_ns / 3.6e12
+    order = np.argsort(step_hours)
+    sorted_steps = step_hours[order]
+    pos = np.searchsorted(sorted_steps, target_hours)
+    pos = np.clip(pos, 1, len(sorted_steps) - 1)
+    left = pos - 1
+    choose = np.where(
+        np.abs(sorted_steps[left] - target_hours)
+        <= np.abs(sorted_steps[pos] - target_hours),
+        left,
+        pos,
+    )
+    mask = np.abs(sorted_steps[choose] - target_hours) < 0.5  # Within 30 minutes
+    indices = order[choose[mask]]
+
+    for hour in target_hours[~mask]:
+        print(f"  Warning: No step found near hour {hour}")
+
+    return indices
+
+
+def _write_cgan_netcdf(
+    output_file,
+    cgan_var_name,
+    data,
+    init_time,
+    members,
+    latitudes,
+    longitudes,
+    long_name,
+    units,
+    original_var_name,
+    start_hour,
+    end_hour,
+    hour_interval,
+    source_name=None,
+):
+    """
+    Write a (member, valid_time, latitude, longitude) cube to a CGAN-format
+    NetCDF file with a leading singleton time dimension.
+
+    Dims, variables and attributes are all declared up front so the file goes
+    through a single define/data cycle and the data lands with one slab
+    assignment.
+    """
+    nmember, nvalid, nlat, nlon = data.shape
+
+    # Create output directory if it doesn't exist
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+
+    print(f"  Saving to: {output_file}")
+    print(f"  Output dimensions: {{'time': 1, 'member': {nmember}, "
+          f"'valid_time': {nvalid}, 'latitude': {nlat}, 'longitude': {nlon}}}")
+
+    nc_out = netCDF4.Dataset(output_file, 'w', format='NETCDF4')
+
+    nc_out.createDimension('time', 1)
+    nc_out.createDimension('member', nmember)
+    nc_out.createDimension('valid_time', nvalid)
+    nc_out.createDimension('latitude', nlat)
+    nc_out.createDimension('longitude', nlon)
+
+    # Chunk the variable per (time, member, valid_time) slab across lat/lon to
+    # match how cGAN inference reads it back, with light compression: chunks
+    # this size compress well and each slab comes back in a single read.
+    var_out = nc_out.createVariable(
+        cgan_var_name, 'f4',
+        ('time', 'member', 'valid_time', 'latitude', 'longitude'),
+        chunksizes=(1, 1, 1, nlat, nlon),
+        zlib=True, complevel=1, shuffle=True,
+    )
+    time_var = nc_out.createVariable('time', 'f8', ('time',))
+    member_var = nc_out.createVariable('member', members.dtype, ('member',))
+    valid_time_var = nc_out.createVariable('valid_time', 'i4', ('valid_time',))
+    lat_var = nc_out.createVariable('latitude', latitudes.dtype, ('latitude',))
+    lon_var = nc_out.createVariable('longitude', longitudes.dtype, ('longitude',))
+
+    # Variable attributes
+    var_out.setncatts({
+        'long_name': long_name,
+        'units': units,
+        'original_variable': original_var_name,
+    })
+
+    # Global attributes
+    nc_out.setncatts({
+        'title': f'GEFS {cgan_var_name} for cGAN inference',
+        'source': 'GEFS (Global Ensemble Forecast System)',
+        'institution': 'NOAA/NCEP',
+        'created_by': 'restructure_for_cgan.py',
+        'description': f'Restructured ensemble forecast for cGAN processing',
+        'forecast_hours': f'{start_hour}-{end_hour} (every {hour_interval}h)',
+        'ensemble_size': nmember,
+        'original_file': source_name or '',
+    })
+
+    # Write coordinates, then the data in one assignment
+    time_var[:] = [init_time]
+    member_var[:] = members
+    valid_time_var[:] = np.arange(nvalid)  # Simple index for valid_time
+    lat_var[:] = latitudes
+    lon_var[:] = longitudes
+
+    # The step-selected subset can come back strided; handing HDF5 a
+    # contiguous buffer in the declared dim order (with the leading singleton
+    # time axis) turns the chunk writes into plain memcpys
+    final = np.ascontiguousarray(data)[np.newaxis, ...]
+    var_out[:] = final
+
+    nc_out.close()
+
+
+def _write_cgan_zarr(
+    output_path,
+    cgan_var_name,
+    data,
+    init_time,
+    members,
+    latitudes,
+    longitudes,
+    long_name,
+    units,
+    original_var_name,
+    start_hour,
+    end_hour,
+    hour_interval,
+    source_name=None,
+):
+    """
+    Zarr variant of _write_cgan_netcdf: same layout, one store key per
+    (time, member, valid_time) slab. Zarr has no single-writer file lock, so
+    the dask threads write chunks in parallel, and Blosc zstd with shuffle
+    compresses comparably to deflate at several times the throughput.
+    """
+    import zarr  # only needed for --format zarr
+
+    nmember, nvalid, nlat, nlon = data.shape
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    print(f"  Saving to: {output_path}")
+    print(f"  Output dimensions: {{'time': 1, 'member': {nmember}, "
+          f"'valid_time': {nvalid}, 'latitude': {nlat}, 'longitude': {nlon}}}")
+
+    final = np.ascontiguousarray(data)[np.newaxis, ...]
+    ds_out = xr.Dataset(
+        {
+            cgan_var_name: (
+                ('time', 'member', 'valid_time', 'latitude', 'longitude'),
+                final,
+            )
+        },
+        coords={
+            'time': [init_time],
+            'member': members,
+            'valid_time': np.arange(nvalid),  # Simple index for valid_time
+            'latitude': latitudes,
+            'longitude': longitudes,
+        },
+    )
+    ds_out[cgan_var_name].attrs.update({
+        'long_name': long_name,
+        'units': units,
+        'original_variable': original_var_name,
+    })
+    ds_out.attrs.update({
+        'title': f'GEFS {cgan_var_name} for cGAN inference',
+        'source': 'GEFS (Global Ensemble Forecast System)',
+        'institution': 'NOAA/NCEP',
+        'created_by': 'restructure_for_cgan.py',
+        'description': f'Restructured ensemble forecast for cGAN processing',
+        'forecast_hours': f'{start_hour}-{end_hour} (every {hour_interval}h)',
+        'ensemble_size': nmember,
+        'original_file': source_name or '',
+    })
+
+    # The compressor encoding key changed between zarr-python major versions:
+    # v2 takes a numcodecs codec under 'compressor', v3 a codec tuple under
+    # 'compressors'
+    if int(zarr.__version__.split('.')[0]) >= 3:
+        from zarr.codecs import BloscCodec
+        compression = {
+            'compressors': (BloscCodec(cname='zstd', clevel=1, shuffle='shuffle'),),
+        }
+    else:
+        from numcodecs import Blosc
+        compression = {
+            'compressor': Blosc(cname='zstd', clevel=1, shuffle=Blosc.SHUFFLE),
+        }
+    encoding = {
+        cgan_var_name: dict({'chunks': (1, 1, 1, nlat, nlon)}, **compression)
+    }
+    try:
+        ds_out.to_zarr(output_path, mode='w', consolidated=True, encoding=encoding)
+    except Exception:
+        # A failed write can leave a store with coords and metadata but no
+        # data variable; remove it so it cannot be mistaken for output
+        shutil.rmtree(output_path, ignore_errors=True)
+        raise
+
+
+def restructure_dataset_for_cgan(
+    ds: xr.Dataset,
+    original_var_name: str,
     output_file: str,
     start_hour: int = 30,
     end_hour: int = 54,
     hour_interval: int = 6,
-    year: int = 2025
+    year: int = 2025,
+    source_name: str = None,
+    output_format: str = 'nc'
 ):
     """
-    Restructure a NetCDF file from ensemble format to CGAN format.
+    Restructure one variable of an open ensemble Dataset into CGAN format.
 
     Parameters:
     -----------
-    input_file : str
-        Path to input NetCDF file with dimensions (member, valid_times, lat, lon)
+    ds : xr.Dataset
+        Open dataset with dimensions (member, valid_times, lat, lon)
+    original_var_name : str
+        Name of the data variable in ds to restructure
     output_file : str
         Path to output NetCDF file
     start_hour : int
@@ -55,19 +309,12 @@ def restructure_netcdf_for_cgan(
         Interval between forecast hours (default: 6)
     year : int
         Year for the output file naming
+    source_name : str
+        Name of the originating file, recorded in the output attributes
+    output_format : str
+        'nc' for NetCDF4 output (default) or 'zarr' for a Zarr store
     """
 
-    print(f"\nProcessing: {input_file}")
-
-    # Open dataset without decoding times to avoid conflicts
-    ds = xr.open_dataset(input_file, decode_times=False)
-
-    # Get the variable name (should be only one data variable)
-    var_names = list(ds.data_vars)
-    if len(var_names) != 1:
-        raise ValueError(f"Expected 1 data variable, found {len(var_names)}: {var_names}")
-
-    original_var_name = var_names[0]
     print(f"  Variable: {original_var_name}")
 
     # Map to CGAN variable name
@@ -77,30 +324,26 @@ def restructure_netcdf_for_cgan(
         print(f"  Warning: No mapping found for {original_var_name}, using original name")
         cgan_var_name = original_var_name
 
-    # Convert step from nanoseconds to hours
-    step_hours = ds.step.values / 3.6e12
-    print(f"  Available forecast hours: {step_hours.min():.0f} to {step_hours.max():.0f}")
+    # Step axis stays in raw nanoseconds; only the handful of printed values
+    # get converted to hours
+    step_ns = np.asarray(ds.step.values)
+    print(f"  Available forecast hours: {step_ns.min() / 3.6e12:.0f} "
+          f"to {step_ns.max() / 3.6e12:.0f}")
 
     # Filter to desired forecast hours
     target_hours = np.arange(start_hour, end_hour + 1, hour_interval)
     print(f"  Target forecast hours: {target_hours}")
 
-    # Find indices of target hours
-    indices = []
-    for hour in target_hours:
-        # Find the closest step to target hour
-        idx = np.argmin(np.abs(step_hours - hour))
-        if np.abs(step_hours[idx] - hour) < 0.5:  # Within 30 minutes
-            indices.append(idx)
-        else:
-            print(f"  Warning: No step found near hour {hour}")
+    indices = _find_step_indices(step_ns, target_hours)
 
     if len(indices) == 0:
         raise ValueError(f"No matching forecast hours found between {start_hour} and {end_hour}")
 
-    print(f"  Found {len(indices)} matching forecast hours: {step_hours[indices]}")
+    print(f"  Found {len(indices)} matching forecast hours: {step_ns[indices] / 3.6e12}")
 
     # Select the data
+    # Current: (member, valid_times, latitude, longitude)
+    # Target:  (time, member, valid_time, latitude, longitude)
     data_subset = ds[original_var_name].isel(valid_times=indices)
 
     # Get the time coordinate (initialization time) - should be constant
@@ -109,67 +352,135 @@ def restructure_netcdf_for_cgan(
     else:
         init_time = 0  # Fallback if no time coordinate
 
-    # Create new dimensions
-    # Current: (member, valid_times, latitude, longitude)
-    # Target:  (time, member, valid_time, latitude, longitude)
-
     # Drop coordinates that would conflict with new dimensions
     data_subset = data_subset.reset_coords(drop=True)
 
-    # Add a singleton time dimension at the beginning
-    data_reshaped = data_subset.expand_dims(dim={'init_time': 1}, axis=0)
+    writer = _write_cgan_zarr if output_format == 'zarr' else _write_cgan_netcdf
+    writer(
+        output_file,
+        cgan_var_name,
+        data_subset.values,  # dask computes here
+        init_time,
+        ds.member.values,
+        ds.latitude.values,
+        ds.longitude.values,
+        ds[original_var_name].attrs.get('long_name', cgan_var_name),
+        ds[original_var_name].attrs.get('units', ''),
+        original_var_name,
+        start_hour,
+        end_hour,
+        hour_interval,
+        source_name=source_name,
+    )
 
-    # Rename dimensions to match CGAN expectations
-    data_reshaped = data_reshaped.rename({
-        'valid_times': 'valid_time',
-        'init_time': 'time'
-    })
+    print(f"  ✓ Complete")
 
-    # Create output dataset
-    ds_out = xr.Dataset(
-        {
-            cgan_var_name: data_reshaped
-        },
-        coords={
-            'time': [init_time],
-            'member': ds.member.values,
-            'valid_time': np.arange(len(indices)),  # Simple index for valid_time
-            'latitude': ds.latitude.values,
-            'longitude': ds.longitude.values,
-        }
-    )
+    return output_file
 
-    # Add attributes
-    ds_out[cgan_var_name].attrs.update({
-        'long_name': ds[original_var_name].attrs.get('long_name', cgan_var_name),
-        'units': ds[original_var_name].attrs.get('units', ''),
-        'original_variable': original_var_name,
-    })
 
-    # Add global attributes
-    ds_out.attrs.update({
-        'title': f'GEFS {cgan_var_name} for cGAN inference',
-        'source': 'GEFS (Global Ensemble Forecast System)',
-        'institution': 'NOAA/NCEP',
-        'created_by': 'restructure_for_cgan.py',
-        'description': f'Restructured ensemble forecast for cGAN processing',
-        'forecast_hours': f'{start_hour}-{end_hour} (every {hour_interval}h)',
-        'ensemble_size': len(ds.member),
-        'original_file': os.path.basename(input_file),
-    })
+def restructure_netcdf_for_cgan(
+    input_file: str,
+    output_file: str,
+    start_hour: int = 30,
+    end_hour: int = 54,
+    hour_interval: int = 6,
+    year: int = 2025,
+    output_format: str = 'nc'
+):
+    """
+    Restructure a NetCDF file from ensemble format to CGAN format.
 
-    # Create output directory if it doesn't exist
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    Reads the file directly through netCDF4: the restructure is a single
+    hyperslab read plus a write with a leading singleton axis, so the xarray
+    layer (index building, masked arrays, intermediate copies) is skipped.
 
-    # Save to NetCDF
-    print(f"  Saving to: {output_file}")
-    print(f"  Output dimensions: {dict(ds_out.dims)}")
+    Parameters:
+    -----------
+    input_file : str
+        Path to input NetCDF file with dimensions (member, valid_times, lat, lon)
+    output_file : str
+        Path to output NetCDF file
+    start_hour : int
+        Starting forecast hour (default: 30)
+    end_hour : int
+        Ending forecast hour (default: 54)
+    hour_interval : int
+        Interval between forecast hours (default: 6)
+    year : int
+        Year for the output file naming
+    output_format : str
+        'nc' for NetCDF4 output (default) or 'zarr' for a Zarr store
+    """
 
-    ds_out.to_netcdf(output_file)
+    print(f"\nProcessing: {input_file}")
 
-    # Close datasets
-    ds.close()
-    ds_out.close()
+    src = netCDF4.Dataset(input_file, 'r')
+    src.set_auto_mask(False)  # plain arrays, no masked-array overhead
+
+    try:
+        # Get the variable name (should be only one data variable: the one
+        # that is neither a dimension nor an auxiliary coordinate)
+        coord_names = set(src.dimensions) | {'step', 'time'}
+        var_names = [name for name in src.variables if name not in coord_names]
+        if len(var_names) != 1:
+            raise ValueError(f"Expected 1 data variable, found {len(var_names)}: {var_names}")
+
+        original_var_name = var_names[0]
+        print(f"  Variable: {original_var_name}")
+
+        # Map to CGAN variable name
+        if original_var_name in VARIABLE_MAPPING:
+            cgan_var_name = VARIABLE_MAPPING[original_var_name]
+        else:
+            print(f"  Warning: No mapping found for {original_var_name}, using original name")
+            cgan_var_name = original_var_name
+
+        # Step axis stays in raw nanoseconds; only the handful of printed
+        # values get converted to hours
+        step_ns = np.asarray(src.variables['step'][:])
+        print(f"  Available forecast hours: {step_ns.min() / 3.6e12:.0f} "
+              f"to {step_ns.max() / 3.6e12:.0f}")
+
+        # Filter to desired forecast hours
+        target_hours = np.arange(start_hour, end_hour + 1, hour_interval)
+        print(f"  Target forecast hours: {target_hours}")
+
+        indices = _find_step_indices(step_ns, target_hours)
+
+        if len(indices) == 0:
+            raise ValueError(f"No matching forecast hours found between {start_hour} and {end_hour}")
+
+        print(f"  Found {len(indices)} matching forecast hours: {step_ns[indices] / 3.6e12}")
+
+        # One hyperslab read of the selected steps
+        data = src.variables[original_var_name][:, indices, :, :]
+
+        # Get the time coordinate (initialization time) - should be constant
+        if 'time' in src.variables:
+            init_time = np.asarray(src.variables['time'][:]).flat[0]
+        else:
+            init_time = 0  # Fallback if no time coordinate
+
+        src_var = src.variables[original_var_name]
+        writer = _write_cgan_zarr if output_format == 'zarr' else _write_cgan_netcdf
+        writer(
+            output_file,
+            cgan_var_name,
+            data,
+            init_time,
+            np.asarray(src.variables['member'][:]),
+            np.asarray(src.variables['latitude'][:]),
+            np.asarray(src.variables['longitude'][:]),
+            getattr(src_var, 'long_name', cgan_var_name),
+            getattr(src_var, 'units', ''),
+            original_var_name,
+            start_hour,
+            end_hour,
+            hour_interval,
+            source_name=os.path.basename(input_file),
+        )
+    finally:
+        src.close()
 
     print(f"  ✓ Complete")
 
@@ -222,16 +533,33 @@ def main():
         default=None,
         help='Specific variables to process (default: all)'
     )
+    parser.add_argument(
+        '--dask-workers',
+        type=int,
+        default=os.cpu_count() or 2,
+        help='Number of dask threads for chunked read/write (default: CPU count)'
+    )
+    parser.add_argument(
+        '--format',
+        choices=['nc', 'zarr'],
+        default='nc',
+        help='Output format: NetCDF4 file or Zarr store (default: nc)'
+    )
 
     args = parser.parse_args()
 
-    # Find all ensemble files (excluding mean and std)
+    # Threaded dask scheduler so chunked reads and writes overlap
+    dask.config.set(scheduler='threads', num_workers=args.dask_workers)
+
+    # Find all ensemble files (excluding mean and std) with one precompiled
+    # pattern over a plain directory listing — no stat call per entry
     input_dir = Path(args.input_dir)
-    ensemble_files = sorted(input_dir.glob('ensemble_*.nc'))
-    ensemble_files = [
-        f for f in ensemble_files
-        if 'mean' not in f.name and 'std' not in f.name
-    ]
+    ensemble_pattern = re.compile(r'^ensemble_(?!.*(?:mean|std)).*\.nc$')
+    ensemble_files = sorted(
+        input_dir / name
+        for name in (os.listdir(input_dir) if input_dir.is_dir() else [])
+        if ensemble_pattern.match(name)
+    )
 
     if not ensemble_files:
         print(f"No ensemble files found in {input_dir}")
@@ -243,11 +571,20 @@ def main():
     output_dir = Path(args.output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    # Process each file
-    for input_file in ensemble_files:
-        # Extract variable name from filename (ensemble_VARNAME.nc)
-        var_name = input_file.stem.replace('ensemble_', '')
+    # Open all ensemble files as one lazy Dataset. Each file holds a single
+    # distinct variable on the same grid, so merging by coordinates gives one
+    # Dataset with every variable; parallel=True opens the files on the dask
+    # scheduler and the shared coords are decoded once instead of per file.
+    ds = xr.open_mfdataset(
+        [str(f) for f in ensemble_files],
+        combine='by_coords',
+        parallel=True,
+        decode_times=False,
+        chunks={'member': 1, 'valid_times': -1},
+    )
 
+    # Process each variable
+    for var_name in ds.data_vars:
         # Skip if specific variables requested and this isn't one
         if args.variables and var_name not in args.variables:
             print(f"Skipping {var_name} (not in requested variables)")
@@ -256,22 +593,28 @@ def main():
         # Get the CGAN variable name
         cgan_var = VARIABLE_MAPPING.get(var_name, var_name)
 
-        # Create output filename: {cgan_var}_{year}.nc
-        output_file = output_dir / f"{cgan_var}_{args.year}.nc"
+        # Create output filename: {cgan_var}_{year}.{nc,zarr}
+        output_file = output_dir / f"{cgan_var}_{args.year}.{args.format}"
 
+        print(f"\nProcessing: {var_name}")
         try:
-            restructure_netcdf_for_cgan(
-                str(input_file),
+            restructure_dataset_for_cgan(
+                ds,
+                var_name,
                 str(output_file),
                 start_hour=args.start_hour,
                 end_hour=args.end_hour,
                 hour_interval=args.hour_interval,
-                year=args.year
+                year=args.year,
+                source_name=f'ensemble_{var_name}.nc',
+                output_format=args.format
             )
         except Exception as e:
-            print(f"  ✗ Error processing {input_file}: {e}")
+            print(f"  ✗ Error processing {var_name}: {e}")
             continue
 
+    ds.close()
+
     print("\n" + "="*60)
     print("Processing complete!")
     print(f"Output files saved to: {output_dir}")
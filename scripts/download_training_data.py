@@ -24,12 +24,26 @@ Example:
 
 import argparse
 import concurrent.futures as cf
+import itertools
 import os
 from pathlib import Path
 from typing import List, Tuple
 
 from google.api_core.retry import Retry
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import storage
+from google.oauth2 import service_account
+from requests.adapters import HTTPAdapter
+
+try:
+    from google.cloud.storage import transfer_manager
+except ImportError:  # older google-cloud-storage without transfer_manager
+    transfer_manager = None
+
+try:
+    from tqdm import tqdm
+except ImportError:
+    tqdm = None
 
 
 # Default GCS bucket configuration
@@ -56,21 +70,50 @@ def parse_gcs_uri(gcs_uri: str) -> Tuple[str, str]:
     return bucket, prefix
 
 
-def should_skip(local_path: Path, blob) -> bool:
+def should_skip(rel: str, blob, local_sizes: dict) -> bool:
     """
     Skip download if a local file exists with the same size.
+
+    local_sizes is a {relative path: size} map built from one walk of the
+    destination tree, so each check is a dict lookup rather than a stat call.
     """
-    try:
-        if local_path.exists() and local_path.is_file():
-            return local_path.stat().st_size == blob.size
-    except Exception:
-        pass
-    return False
+    return local_sizes.get(rel) == blob.size
+
+
+def scan_local_sizes(dest_dir: Path) -> dict:
+    """Walk dest_dir once and map each existing file's relative path to its size."""
+    return {
+        str(p.relative_to(dest_dir)): p.stat().st_size
+        for p in dest_dir.rglob("*")
+        if p.is_file()
+    }
+
+
+def _make_progress(total: int, verbose: bool):
+    """
+    Build a progress callback that avoids one stdout write per file: a tqdm
+    bar when available, otherwise a counter line every ~1% of completions.
+    Call it with the number of items processed so far.
+    """
+    if not verbose or total == 0:
+        return lambda processed: None
+    if tqdm is not None:
+        bar = tqdm(total=total, unit="file")
+        def update(processed):
+            bar.update(1)
+            if processed >= total:
+                bar.close()
+        return update
+    every = max(1, total // 100)
+    def update(processed):
+        if processed % every == 0 or processed >= total:
+            print(f"Progress: {processed}/{total}")
+    return update
 
 
 def download_blob(args):
     """Download a single blob from GCS."""
-    (blob, base_prefix, dest_dir, skip_existing, chunk_size) = args
+    (blob, base_prefix, dest_dir, chunk_size) = args
 
     # GCS can have "directory marker" objects ending with '/'
     if blob.name.endswith("/"):
@@ -80,16 +123,31 @@ def download_blob(args):
     local_path = Path(dest_dir) / rel
     local_path.parent.mkdir(parents=True, exist_ok=True)
 
-    if skip_existing and should_skip(local_path, blob):
-        return f"SKIP : {rel} (exists, same size)"
-
     # Optional: set a chunk size for large files (e.g., 8 MiB)
     if chunk_size:
         blob._chunk_size = chunk_size  # pylint: disable=protected-access
 
     # Robust retries on transient errors
     retry = Retry(initial=1.0, maximum=30.0, multiplier=2.0, deadline=300.0)
-    blob.download_to_filename(str(local_path), retry=retry)
+
+    # Stream through a 1 MiB write buffer, then tell the kernel we won't read
+    # these pages back: bulk downloads stop evicting the page cache that the
+    # subsequent training reads actually want
+    try:
+        with open(local_path, "wb", buffering=1 << 20) as f:
+            blob.download_to_file(f, retry=retry)
+            f.flush()
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+    except BaseException:
+        # download_to_filename used to delete the local file on checksum or
+        # not-found failures; keep that behaviour, or a corrupt full-size
+        # file would satisfy the size-only --skip-existing check forever
+        try:
+            os.unlink(local_path)
+        except OSError:
+            pass
+        raise
     return f"OK   : {rel}"
 
 
@@ -97,7 +155,7 @@ def download_gcs_prefix(
     bucket_name: str,
     prefix: str,
     dest_dir: Path,
-    creds_path: str,
+    client: storage.Client,
     skip_existing: bool = True,
     workers: int = 16,
     chunk_size_mb: int = 8,
@@ -110,7 +168,7 @@ def download_gcs_prefix(
         bucket_name: GCS bucket name
         prefix: Prefix/folder path in bucket
         dest_dir: Local destination directory
-        creds_path: Path to service account JSON key
+        client: Shared GCS client (created once by the caller)
         skip_existing: Skip files that already exist locally
         workers: Number of parallel download workers
         chunk_size_mb: Download chunk size in MiB
@@ -122,18 +180,22 @@ def download_gcs_prefix(
     dest_dir = Path(dest_dir).resolve()
     dest_dir.mkdir(parents=True, exist_ok=True)
 
-    # Initialize GCS client
-    client = storage.Client.from_service_account_json(creds_path)
     bucket = client.bucket(bucket_name)
 
     # Ensure prefix ends with /
     if prefix and not prefix.endswith("/"):
         prefix += "/"
 
-    # List all blobs with the prefix
+    # List all blobs with the prefix, fetching only the metadata the skip
+    # check and scheduler use (name/size/md5) instead of the full ACL,
+    # generation etc. — a several-fold smaller listing payload
     if verbose:
         print(f"Listing objects in gs://{bucket_name}/{prefix}")
-    blobs_iter = bucket.list_blobs(prefix=prefix)
+    blobs_iter = client.list_blobs(
+        bucket_name,
+        prefix=prefix,
+        fields="items(name,size,md5Hash),nextPageToken",
+    )
 
     # Materialize the list
     blobs = list(blobs_iter)
@@ -145,30 +207,92 @@ def download_gcs_prefix(
     if verbose:
         print(f"Found {len(blobs)} objects. Starting download to {dest_dir} ...")
 
+    # Resolve which blobs actually need downloading (drop directory markers
+    # and, when requested, files already present locally with the same size).
+    # The local sizes come from a single directory walk rather than one stat
+    # syscall per blob, which matters on resumed runs over large trees.
+    local_sizes = scan_local_sizes(dest_dir) if skip_existing else {}
+    to_download = []
+    for b in blobs:
+        if b.name.endswith("/"):
+            continue
+        rel = b.name[len(prefix):].lstrip("/")
+        if skip_existing and should_skip(rel, b, local_sizes):
+            if verbose:
+                print(f"SKIP : {rel} (exists, same size)")
+            continue
+        to_download.append((rel, b))
+
+    # Largest-first scheduling: start the biggest blobs immediately so a large
+    # file listed last can't leave one worker running long after the rest
+    # drained (classic LPT ordering to shorten the tail)
+    to_download.sort(key=lambda item: item[1].size or 0, reverse=True)
+
+    # Fast path: transfer_manager batches the requests and slices large
+    # downloads internally, avoiding one Python-level call per blob.
+    # PROCESS workers give true parallelism for checksumming/decompression;
+    # the client is pickled once per worker process (one auth setup each),
+    # never per task.
+    if transfer_manager is not None:
+        rel_names = [rel for rel, _ in to_download]
+        results = transfer_manager.download_many_to_path(
+            bucket,
+            rel_names,
+            destination_directory=str(dest_dir),
+            blob_name_prefix=prefix,
+            max_workers=workers,
+            worker_type=transfer_manager.PROCESS,
+            raise_exception=False,
+        )
+        # download_many_to_path blocks until every transfer is done, so there
+        # is no point feeding a progress bar from its results — it would jump
+        # 0 to 100% in one burst. Only the final summary is reported here;
+        # incremental progress belongs to the threaded fallback below.
+        completed = 0
+        errors = 0
+        for rel, result in zip(rel_names, results):
+            if isinstance(result, Exception):
+                errors += 1
+                print(f"ERROR: {rel}: {result}")
+            else:
+                completed += 1
+        if verbose:
+            print(f"Completed: {completed}, Errors: {errors}, Total: {len(blobs)}")
+        return completed, errors
+
+    # Fallback: per-blob thread pool for older google-cloud-storage releases
     # Prepare work items
     work = []
     chunk_size = chunk_size_mb * 1024 * 1024 if chunk_size_mb > 0 else None
-    for b in blobs:
-        work.append((b, prefix, dest_dir, skip_existing, chunk_size))
+    for _, b in to_download:
+        work.append((b, prefix, dest_dir, chunk_size))
 
-    # Download in parallel
+    # Download in parallel, handling results as they complete rather than in
+    # submission order, so one slow blob never stalls progress reporting for
+    # the others. Keep at most 2x workers submitted at a time so huge blob
+    # lists don't pile up as pending futures.
     completed = 0
     errors = 0
+    progress = _make_progress(len(work), verbose)
     with cf.ThreadPoolExecutor(max_workers=workers) as ex:
-        for result in ex.map(download_blob, work, chunksize=10):
-            if result.startswith("OK"):
-                completed += 1
-            elif result.startswith("SKIP"):
-                if verbose:
+        work_iter = iter(work)
+        pending = {
+            ex.submit(download_blob, w)
+            for w in itertools.islice(work_iter, workers * 2)
+        }
+        while pending:
+            done, pending = cf.wait(pending, return_when=cf.FIRST_COMPLETED)
+            # Refill the window with one new task per completed one
+            for w in itertools.islice(work_iter, len(done)):
+                pending.add(ex.submit(download_blob, w))
+            for fut in done:
+                result = fut.result()
+                if result.startswith("OK"):
+                    completed += 1
+                else:
+                    errors += 1
                     print(result)
-            elif result.startswith("DIR"):
-                pass
-            else:
-                errors += 1
-
-            # Print progress for successful downloads
-            if result.startswith("OK") and verbose:
-                print(result)
+                progress(completed + errors)
 
     if verbose:
         print(f"Completed: {completed}, Errors: {errors}, Total: {len(blobs)}")
@@ -302,6 +426,26 @@ Examples:
         print("=" * 60)
         print()
 
+    # One client for the whole run: its auth token exchange happens once
+    # instead of once per prefix, and every prefix shares the same pooled
+    # HTTP session (connections sized to the worker count). The session has
+    # to be injected at construction time; Client._http is a read-only
+    # property and cannot be replaced afterwards. The credentials must be
+    # scoped here: storage.Client only scopes its own copy, while every
+    # request refreshes these, and the token endpoint rejects an unscoped
+    # service-account grant.
+    creds = service_account.Credentials.from_service_account_file(
+        args.creds, scopes=storage.Client.SCOPE
+    )
+    session = AuthorizedSession(creds)
+    session.mount(
+        "https://",
+        HTTPAdapter(pool_connections=args.workers, pool_maxsize=args.workers * 2),
+    )
+    client = storage.Client(
+        project=creds.project_id, credentials=creds, _http=session
+    )
+
     # Download each path
     total_completed = 0
     total_errors = 0
@@ -322,7 +466,7 @@ Examples:
                 bucket_name=args.bucket,
                 prefix=path,
                 dest_dir=local_dest,
-                creds_path=args.creds,
+                client=client,
                 skip_existing=args.skip_existing,
                 workers=args.workers,
                 chunk_size_mb=args.chunk_size_mb,
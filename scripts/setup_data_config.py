@@ -29,12 +29,34 @@ import os
 import sys
 from pathlib import Path
 
+try:
+    import yaml
+    # Prefer the libyaml C loader/dumper when PyYAML was built with it
+    _YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    _YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+except ImportError:
+    yaml = None
+
+
+def _require_yaml():
+    """Exit with an install hint if PyYAML is missing."""
+    if yaml is None:
+        print("Error: PyYAML not installed. Install with: pip install pyyaml")
+        sys.exit(1)
+
+
+_REPO_ROOT = None
+
 
 def get_repo_root():
-    """Find the repository root directory."""
+    """Find the repository root directory (cached after the first lookup)."""
+    global _REPO_ROOT
+    if _REPO_ROOT is not None:
+        return _REPO_ROOT
     current = Path(__file__).resolve().parent
     while current != current.parent:
         if (current / "config").exists():
+            _REPO_ROOT = current
             return current
         current = current.parent
     raise FileNotFoundError("Could not find repository root (no 'config' directory)")
@@ -42,29 +64,22 @@ def get_repo_root():
 
 def read_data_paths_yaml(config_path):
     """Read existing data_paths.yaml file."""
-    try:
-        import yaml
-    except ImportError:
-        print("Error: PyYAML not installed. Install with: pip install pyyaml")
-        sys.exit(1)
+    _require_yaml()
 
     if not config_path.exists():
         return {}
 
     with open(config_path, "r") as f:
-        return yaml.safe_load(f) or {}
+        return yaml.load(f, Loader=_YAML_LOADER) or {}
 
 
 def write_data_paths_yaml(config_path, data):
     """Write data_paths.yaml file."""
-    try:
-        import yaml
-    except ImportError:
-        print("Error: PyYAML not installed. Install with: pip install pyyaml")
-        sys.exit(1)
+    _require_yaml()
 
     with open(config_path, "w") as f:
-        yaml.dump(data, f, default_flow_style=False, sort_keys=False)
+        yaml.dump(data, f, Dumper=_YAML_DUMPER,
+                  default_flow_style=False, sort_keys=False)
 
 
 def generate_config_entry(
@@ -89,23 +104,23 @@ def generate_config_entry(
     Returns:
         Dictionary with configuration entry
     """
-    base_path = str(Path(base_path).resolve())
-
-    # Set defaults
-    if forecast_path is None:
-        forecast_path = base_path
-    if truth_path is None:
-        truth_path = os.path.join(base_path, "TRUTH")
-    if constants_path is None:
-        constants_path = os.path.join(base_path, "constants")
-    if tfrecords_path is None:
-        tfrecords_path = os.path.join(base_path, "tfrecords")
+    # abspath+normpath normalize without the symlink-chasing stat calls (and
+    # Path object construction) that Path.resolve() performs
+    base_path = os.path.abspath(os.path.normpath(base_path))
+
+    # Set defaults by direct string assembly — base_path is already
+    # normalized, so os.path.join's separator logic is pure overhead here
+    base = base_path.rstrip("/")
+    forecast_path = forecast_path or base_path
+    truth_path = truth_path or f"{base}/TRUTH"
+    constants_path = constants_path or f"{base}/constants"
+    tfrecords_path = tfrecords_path or f"{base}/tfrecords"
 
     # Ensure paths end with /
-    forecast_path = forecast_path.rstrip("/") + "/"
-    truth_path = truth_path.rstrip("/") + "/"
-    constants_path = constants_path.rstrip("/") + "/"
-    tfrecords_path = tfrecords_path.rstrip("/") + "/"
+    forecast_path, truth_path, constants_path, tfrecords_path = [
+        p.rstrip("/") + "/"
+        for p in (forecast_path, truth_path, constants_path, tfrecords_path)
+    ]
 
     return {
         config_name: {
@@ -123,10 +138,11 @@ def generate_config_entry(
 
 def interactive_setup():
     """Interactive configuration setup."""
-    print("=" * 60)
-    print("Interactive Data Paths Configuration")
-    print("=" * 60)
-    print()
+    sys.stdout.write(
+        "============================================================\n"
+        "Interactive Data Paths Configuration\n"
+        "============================================================\n\n"
+    )
 
     # Get configuration name
     config_name = input("Configuration name (e.g., VM_SESSION, LOCAL_DATA): ").strip()
@@ -272,19 +288,26 @@ Examples:
     # Merge configurations
     existing_config.update(new_config)
 
-    # Print configuration
+    # Print configuration in one stdout write instead of a dozen print calls
     config_name = list(new_config.keys())[0]
-    print("\n" + "=" * 60)
-    print("Generated Configuration")
-    print("=" * 60)
-    print(f"\n{config_name}:")
-    print(f"  GENERAL:")
-    print(f"    TRUTH_PATH: {new_config[config_name]['GENERAL']['TRUTH_PATH']}")
-    print(f"    FORECAST_PATH: {new_config[config_name]['GENERAL']['FORECAST_PATH']}")
-    print(f"    CONSTANTS_PATH: {new_config[config_name]['GENERAL']['CONSTANTS_PATH']}")
-    print(f"  TFRecords:")
-    print(f"    tfrecords_path: {new_config[config_name]['TFRecords']['tfrecords_path']}")
-    print()
+    general = new_config[config_name]["GENERAL"]
+    tfrecords = new_config[config_name]["TFRecords"]
+    sys.stdout.write(
+        f"""
+{"=" * 60}
+Generated Configuration
+{"=" * 60}
+
+{config_name}:
+  GENERAL:
+    TRUTH_PATH: {general['TRUTH_PATH']}
+    FORECAST_PATH: {general['FORECAST_PATH']}
+    CONSTANTS_PATH: {general['CONSTANTS_PATH']}
+  TFRecords:
+    tfrecords_path: {tfrecords['tfrecords_path']}
+
+"""
+    )
 
     # Write or dry-run
     if args.dry_run:
@@ -308,39 +331,43 @@ Examples:
             if local_config_path.exists():
                 # Read existing local config
                 with open(local_config_path, "r") as f:
-                    import yaml
-                    local_config = yaml.safe_load(f) or {}
+                    local_config = yaml.load(f, Loader=_YAML_LOADER) or {}
 
                 # Update data_paths setting
                 local_config["data_paths"] = config_name
 
                 # Write back
                 with open(local_config_path, "w") as f:
-                    yaml.dump(local_config, f, default_flow_style=False, sort_keys=False)
+                    yaml.dump(local_config, f, Dumper=_YAML_DUMPER,
+                              default_flow_style=False, sort_keys=False)
 
                 print(f"Updated local_config.yaml to use '{config_name}'")
 
-    # Print next steps
-    print("\n" + "=" * 60)
-    print("Next Steps")
-    print("=" * 60)
-    print(f"1. Verify data exists at configured paths:")
-    print(f"   ls {new_config[config_name]['GENERAL']['FORECAST_PATH']}")
-    print(f"   ls {new_config[config_name]['GENERAL']['TRUTH_PATH']}")
-    print(f"   ls {new_config[config_name]['GENERAL']['CONSTANTS_PATH']}")
-    print()
-    print("2. Update config/local_config.yaml to use this configuration:")
-    print(f"   data_paths: \"{config_name}\"")
-    print()
-    print("3. Test configuration:")
-    print("   python -c \"from config import get_data_paths; import pprint; pprint.pprint(get_data_paths())\"")
-    print()
-    print("4. Generate forecast normalization:")
-    print("   python -c \"from data import gen_fcst_norm; gen_fcst_norm(year='2018')\"")
-    print()
-    print("5. Create TFRecords:")
-    print("   python -c \"from data import write_data; write_data(2018)\"")
-    print("=" * 60)
+    # Print next steps as a single f-string template written once
+    sys.stdout.write(
+        f"""
+{"=" * 60}
+Next Steps
+{"=" * 60}
+1. Verify data exists at configured paths:
+   ls {general['FORECAST_PATH']}
+   ls {general['TRUTH_PATH']}
+   ls {general['CONSTANTS_PATH']}
+
+2. Update config/local_config.yaml to use this configuration:
+   data_paths: "{config_name}"
+
+3. Test configuration:
+   python -c "from config import get_data_paths; import pprint; pprint.pprint(get_data_paths())"
+
+4. Generate forecast normalization:
+   python -c "from data import gen_fcst_norm; gen_fcst_norm(year='2018')"
+
+5. Create TFRecords:
+   python -c "from data import write_data; write_data(2018)"
+{"=" * 60}
+"""
+    )
 
     return 0
 
@@ -2,12 +2,18 @@
 #!/usr/bin/env python3
 import argparse
 import concurrent.futures as cf
+import json
 import os
+import stat
+import threading
 from pathlib import Path
 from typing import Tuple
 
-from google.api_core.retry import Retry
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import storage
+from google.cloud.storage.retry import DEFAULT_RETRY
+from google.oauth2 import service_account
+from requests.adapters import HTTPAdapter
 """
 python gcs_folder_download.py \
   gs://geosfm/geosfm_input_icpac_pc/20250818 \
@@ -17,6 +23,25 @@ python gcs_folder_download.py \
   --workers 16
 """
 
+# Directories already created this run; makedirs with parents walks and stats
+# every ancestor, so for flat prefixes with thousands of files this cache
+# collapses those syscalls to one per unique directory
+_MKDIR_CACHE = set()
+_MKDIR_LOCK = threading.Lock()
+
+# download_blob result codes; log strings are only built when actually printed
+OK, SKIP, DIR, ERR = 0, 1, 2, 3
+_STATUS_NAMES = {OK: "ok", SKIP: "skip", DIR: "dir", ERR: "error"}
+
+
+def _ensure_dir(parent: str):
+    """Create parent once; later calls for the same directory are a set lookup."""
+    if parent in _MKDIR_CACHE:
+        return
+    os.makedirs(parent, exist_ok=True)
+    with _MKDIR_LOCK:
+        _MKDIR_CACHE.add(parent)
+
 def parse_gcs_uri(gcs_uri: str) -> Tuple[str, str]:
     """
     Parse a GCS URI like gs://bucket/path/to/prefix into (bucket, prefix).
@@ -24,50 +49,161 @@ def parse_gcs_uri(gcs_uri: str) -> Tuple[str, str]:
     """
     if not gcs_uri.startswith("gs://"):
         raise ValueError("GCS URI must start with gs://")
-    remainder = gcs_uri[5:]
-    parts = remainder.split("/", 1)
-    bucket = parts[0]
-    prefix = ""
-    if len(parts) == 2:
-        prefix = parts[1].strip("/")
-    if prefix and not prefix.endswith("/"):
-        prefix += "/"
-    return bucket, prefix
-
-
-def should_skip(local_path: Path, blob) -> bool:
+    bucket, _, prefix = gcs_uri[5:].partition("/")
+    prefix = prefix.strip("/")
+    return bucket, prefix + "/" if prefix else ""
+
+
+def should_skip(local_path: str, size: int) -> bool:
     """
     Skip download if a local file exists with the same size.
+
+    A single os.stat call replaces the separate exists/is_file/stat checks,
+    which were three stat syscalls per blob.
     """
     try:
-        if local_path.exists() and local_path.is_file():
-            return local_path.stat().st_size == blob.size
-    except Exception:
-        pass
-    return False
+        st = os.stat(local_path)
+    except OSError:
+        return False
+    return stat.S_ISREG(st.st_mode) and st.st_size == size
 
 
 def download_blob(args):
-    (blob, base_prefix, dest_dir, skip_existing, chunk_size) = args
+    # Workers receive plain (name, size) data and build the Blob themselves:
+    # the listing loop only has to hold two scalars per object, not a full
+    # Blob with its metadata dict
+    (bucket, name, size, prefix_len, dest_dir, skip_existing, chunk_size) = args
     # GCS can have "directory marker" objects ending with '/'
-    if blob.name.endswith("/"):
-        return f"DIR  : {blob.name} (skipped marker)"
+    if name.endswith("/"):
+        return DIR, name
+
+    rel = name[prefix_len:].lstrip("/")
+    # Plain string paths: no Path object construction per blob
+    local_path = os.path.join(str(dest_dir), rel)
 
-    rel = blob.name[len(base_prefix):].lstrip("/")
-    local_path = Path(dest_dir) / rel
-    local_path.parent.mkdir(parents=True, exist_ok=True)
+    # Check for an existing file before touching the directory cache: on a
+    # resumed run the skip path is the hot path, and it needs nothing beyond
+    # the one stat inside should_skip
+    if skip_existing and should_skip(local_path, size):
+        return SKIP, rel
 
-    if skip_existing and should_skip(local_path, blob):
-        return f"SKIP : {rel} (exists, same size)"
+    _ensure_dir(os.path.dirname(local_path))
 
-    # Optional: set a chunk size for large files (e.g., 8 MiB)
+    blob = bucket.blob(name)
     if chunk_size:
-        blob._chunk_size = chunk_size  # pylint: disable=protected-access
+        blob.chunk_size = chunk_size
+
+    # Preallocate the file at its final size and stream into it through one
+    # large buffer: fewer write(2) calls per MiB and no fragmentation from
+    # growing the file chunk by chunk
+    fd = os.open(local_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        with os.fdopen(fd, "wb", buffering=1 << 20) as f:
+            if size and hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(f.fileno(), 0, size)
+            blob.download_to_file(f, retry=DEFAULT_RETRY)
+    except BaseException:
+        # The preallocated file already has its final size, so leaving it
+        # behind after a failed download would make a --skip-existing rerun
+        # treat the zero-filled file as complete
+        try:
+            os.unlink(local_path)
+        except OSError:
+            pass
+        raise
+    return OK, rel
+
+
+def _get_access_token(creds_path: str) -> str:
+    """Exchange the service-account key for an OAuth2 bearer token."""
+    import google.auth.transport.requests
+    from google.oauth2 import service_account
+
+    creds = service_account.Credentials.from_service_account_file(
+        creds_path,
+        scopes=["https://www.googleapis.com/auth/devstorage.read_only"],
+    )
+    creds.refresh(google.auth.transport.requests.Request())
+    return creds.token
+
+
+def download_async(bucket_name, blobs, prefix, dest_dir, token,
+                   workers, chunk_size, skip_existing, log=None) -> Tuple[int, int]:
+    """
+    Single-threaded asyncio downloader hitting the GCS HTTP endpoint directly.
+
+    blobs is a list of (name, size). For many small objects the workload is
+    request-latency-bound, and one event loop keeps hundreds of requests in
+    flight over kept-alive connections at a fraction of the thread-pool cost.
+    Requires aiohttp and aiofiles (only imported on the --async path).
+    """
+    import asyncio
+
+    import aiofiles
+    import aiohttp
+
+    dest_dir = str(dest_dir)
+    read_chunk = chunk_size or (1 << 20)
+    prefix_len = len(prefix)
+
+    async def fetch(session, name, size):
+        if name.endswith("/"):
+            return DIR, name
+
+        rel = name[prefix_len:].lstrip("/")
+        local_path = os.path.join(dest_dir, rel)
+
+        if skip_existing and should_skip(local_path, size):
+            return SKIP, rel
+
+        _ensure_dir(os.path.dirname(local_path))
 
-    # Robust retries on transient errors
-    retry = Retry(initial=1.0, maximum=30.0, multiplier=2.0, deadline=300.0)
-    blob.download_to_filename(str(local_path), retry=retry)
-    return f"OK   : {rel}"
+        url = f"https://storage.googleapis.com/{bucket_name}/{name}"
+        async with session.get(url) as resp:
+            resp.raise_for_status()
+            async with aiofiles.open(local_path, "wb") as f:
+                async for part in resp.content.iter_chunked(read_chunk):
+                    await f.write(part)
+        return OK, rel
+
+    async def guarded(session, name, size):
+        # Failures come back as a result carrying the object name, so they
+        # reach the log and the error count like any other outcome
+        try:
+            return await fetch(session, name, size)
+        except Exception as e:
+            print(f"ERROR: {name}: {e}")
+            return ERR, name
+
+    async def run():
+        completed = 0
+        skipped = 0
+        errors = 0
+        step = max(1, len(blobs) // 100)
+        connector = aiohttp.TCPConnector(limit=workers * 4)
+        headers = {"Authorization": f"Bearer {token}"}
+        async with aiohttp.ClientSession(
+            connector=connector, headers=headers
+        ) as session:
+            tasks = [guarded(session, name, size) for name, size in blobs]
+            for coro in asyncio.as_completed(tasks):
+                status, rel = await coro
+                if status == OK:
+                    completed += 1
+                elif status == SKIP:
+                    skipped += 1
+                elif status == ERR:
+                    errors += 1
+                if log is not None and status != DIR:
+                    log.write(json.dumps(
+                        {"status": _STATUS_NAMES[status], "object": rel}) + "\n")
+                done = completed + skipped
+                if done % step == 0:
+                    print(f"  {done}/{len(blobs)} "
+                          f"({completed} downloaded, {skipped} skipped)")
+        return completed, errors
+
+    return asyncio.run(run())
 
 
 def main():
@@ -100,49 +236,176 @@ def main():
         default=8,
         help="Download chunk size in MiB (helpful for large files). Set 0 to use default.",
     )
+    p.add_argument(
+        "--manifest",
+        help="Read object names from this file (one per line, with an "
+             "optional size as a last whitespace-separated column) instead "
+             "of listing the bucket",
+    )
+    p.add_argument(
+        "--log-file",
+        help="Append one JSON record per object to this file instead of "
+             "printing every OK line (progress is summarized on stdout)",
+    )
+    p.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Use a single-threaded asyncio downloader (best for many small files; "
+             "requires aiohttp and aiofiles)",
+    )
     args = p.parse_args()
 
     bucket_name, prefix = parse_gcs_uri(args.gcs_uri)
     dest_dir = Path(args.dest).resolve()
     dest_dir.mkdir(parents=True, exist_ok=True)
+    _MKDIR_CACHE.add(str(dest_dir))
 
-    client = storage.Client.from_service_account_json(args.creds)
+    # Route every request through one authorized session with a connection
+    # pool sized for the worker count: connections are kept alive and reused
+    # across blobs instead of being re-established, and transient connection
+    # failures are retried at the transport layer. Client._http is read-only,
+    # so the session must be handed over at construction time, and the
+    # credentials must be scoped here — the session refreshes these directly,
+    # and the token endpoint rejects an unscoped service-account grant.
+    creds = service_account.Credentials.from_service_account_file(
+        args.creds,
+        scopes=["https://www.googleapis.com/auth/devstorage.read_only"],
+    )
+    session = AuthorizedSession(creds)
+    session.mount("https://", HTTPAdapter(
+        pool_connections=args.workers,
+        pool_maxsize=args.workers * 4,
+        max_retries=5,
+    ))
+    client = storage.Client(
+        project=creds.project_id, credentials=creds, _http=session
+    )
     bucket = client.bucket(bucket_name)
 
-    # List all blobs with the prefix
-    print(f"Listing objects in gs://{bucket_name}/{prefix}")
-    blobs_iter = bucket.list_blobs(prefix=prefix)
-
-    # Materialize the list so we can show counts and parallelize
-    blobs = list(blobs_iter)
-    if not blobs:
-        print("No objects found for given prefix.")
-        return
+    # Both sources are normalized to a stream of (name, size) pairs: cheap to
+    # hold, cheap to hand to workers, and identical for the --async path
+    if args.manifest:
+        # A manifest of known object names skips the listing round-trips
+        # entirely; an optional size column keeps --skip-existing working
+        def _manifest_pairs():
+            with open(args.manifest, "r", encoding="utf-8") as mf:
+                for line in mf:
+                    line = line.strip()
+                    if not line or line.startswith("#"):
+                        continue
+                    parts = line.rsplit(None, 1)
+                    if len(parts) == 2 and parts[1].isdigit():
+                        yield parts[0], int(parts[1])
+                    else:
+                        yield line, 0
 
-    print(f"Found {len(blobs)} objects. Starting download to {dest_dir} ...")
+        print(f"Reading object names from manifest {args.manifest}")
+        pairs_iter = _manifest_pairs()
+    else:
+        # List all blobs with the prefix. The workers only need name and
+        # size, so ask for just those fields (plus the page token) — a
+        # fraction of the full-metadata payload — and use the maximum page
+        # size to cut round-trips.
+        print(f"Listing objects in gs://{bucket_name}/{prefix}")
+        pairs_iter = (
+            (b.name, b.size or 0)
+            for b in client.list_blobs(
+                bucket_name,
+                prefix=prefix,
+                fields="items(name,size),nextPageToken",
+                page_size=1000,
+            )
+        )
 
-    work = []
     chunk_size = args.chunk_size_mb * 1024 * 1024 if args.chunk_size_mb > 0 else None
-    for b in blobs:
-        work.append((b, prefix, dest_dir, args.skip_existing, chunk_size))
 
+    # Per-object records go to a JSON-lines file, not the terminal: printing
+    # one line per blob serializes the consumer loop behind the tty
+    log = open(args.log_file, "a", encoding="utf-8") if args.log_file else None
+
+    if args.use_async:
+        # The event loop wants the full task list up front
+        blobs = list(pairs_iter)
+        if not blobs:
+            print("No objects found for given prefix.")
+            return
+        print(f"Found {len(blobs)} objects. Starting async download to {dest_dir} ...")
+        token = _get_access_token(args.creds)
+        completed, errors = download_async(
+            bucket_name, blobs, prefix, dest_dir, token,
+            args.workers, chunk_size, args.skip_existing, log=log,
+        )
+        if log is not None:
+            log.close()
+        print(f"\nDone. Successful: {completed}, Errors: {errors}, Total listed: {len(blobs)}")
+        return
+
+    # Stream the listing straight into the pool: the first downloads start
+    # while later listing pages are still being fetched, instead of waiting
+    # for the whole prefix to be materialized up front
+    print(f"Starting download to {dest_dir} ...")
+    prefix_len = len(prefix)
+    listed = 0
     completed = 0
+    skipped = 0
     errors = 0
+
+    def handle(fut, name):
+        nonlocal completed, skipped, errors
+        try:
+            status, rel = fut.result()
+        except Exception as e:
+            errors += 1
+            print(f"ERROR: {name}: {e}")
+            status, rel = ERR, name
+        if status == OK:
+            completed += 1
+        elif status == SKIP:
+            skipped += 1
+        elif status == DIR:
+            return
+        if log is not None:
+            log.write(json.dumps(
+                {"status": _STATUS_NAMES[status], "object": rel}) + "\n")
+        done = completed + skipped
+        if done % 100 == 0:
+            print(f"  {done} done ({completed} downloaded, {skipped} skipped)")
+
+    # Cap the in-flight futures at a few batches per worker: enough to keep
+    # the pool saturated while listing pages arrive, without materializing a
+    # future (and a pinned Blob) for every object in a large prefix at once.
+    # The future-to-name map lets a failed download be reported and logged
+    # under its object name.
+    window = args.workers * 4
     with cf.ThreadPoolExecutor(max_workers=args.workers) as ex:
-        for result in ex.map(download_blob, work, chunksize=10):
-            if result.startswith("OK"):
-                completed += 1
-            elif result.startswith("SKIP"):
-                print(result)
-            elif result.startswith("DIR"):
-                pass
-            else:
-                errors += 1
-            # Print minimal progress lines
-            if result.startswith(("OK", "SKIP")):
-                print(result)
-
-    print(f"\nDone. Successful: {completed}, Errors: {errors}, Total listed: {len(blobs)}")
+        pending = {}
+        for name, size in pairs_iter:
+            listed += 1
+            fut = ex.submit(
+                download_blob,
+                (bucket, name, size, prefix_len, dest_dir,
+                 args.skip_existing, chunk_size),
+            )
+            pending[fut] = name
+            if len(pending) >= window:
+                done_futs, _ = cf.wait(
+                    pending, return_when=cf.FIRST_COMPLETED)
+                for fut in done_futs:
+                    handle(fut, pending.pop(fut))
+
+        for fut in cf.as_completed(list(pending)):
+            handle(fut, pending.pop(fut))
+
+    if log is not None:
+        log.close()
+
+    if listed == 0:
+        print("No objects found for given prefix.")
+        return
+
+    print(f"\nDone. Successful: {completed}, Skipped: {skipped}, "
+          f"Errors: {errors}, Total listed: {listed}")
 
 
 if __name__ == "__main__":